@@ -1,54 +1,251 @@
 #!/usr/bin/env python3
-import os, sys, csv, time, json, argparse, datetime as dt
+import os, re, sys, csv, time, json, sqlite3, hashlib, inspect, argparse, itertools, operator, threading, datetime as dt
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Callable, Deque, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse, parse_qs, urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# Concurrent GETs per fan-out; well under GitHub's secondary (abuse) limit of ~100 in flight.
+MAX_WORKERS = 8
+# Repos extracted side by side; each still runs its own MAX_WORKERS fan-out.
+REPO_WORKERS = 4
+# `Link: <...&page=N>; rel="last"` on the first page tells us how many pages to fan out.
+LINK_LAST_RE = re.compile(r'<([^>]+)>;\s*rel="last"')
+# Keep-alive pool per host; sized above the worker count so nested fan-outs never open fresh TLS sessions.
+POOL_MAXSIZE = 32
+# Transient failures (timeouts, 429, 5xx) back off geometrically with jitter, honouring Retry-After.
+# raise_on_status=False hands the final response to raise_for_status / the rate-limit path in _get.
+# backoff_jitter only exists from urllib3 2.0; on 1.26 the backoff is plain geometric.
+RETRY_JITTER = {"backoff_jitter": 0.5} if "backoff_jitter" in inspect.signature(Retry).parameters else {}
+RETRY = Retry(total=6, backoff_factor=2.0, status_forcelist={429, 500, 502, 503, 504}, allowed_methods={"GET"},
+              respect_retry_after_header=True, raise_on_status=False, **RETRY_JITTER)
+# Conditional-request cache; 304 Not Modified replies don't count against the primary rate limit.
+CACHE_DIR = Path(os.environ.get("GH_EXTRACTOR_CACHE") or Path.home() / ".cache" / "gh-extractor")
+# On open, entries unused for CACHE_MAX_AGE seconds are dropped, then the least recently used past CACHE_MAX_BYTES.
+CACHE_MAX_AGE = 30 * 24 * 3600
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+try:
+    import orjson  # optional: 3-5x faster parse/emit than stdlib json on API payloads
+except ImportError:
+    orjson = None
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def json_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode() if orjson else json.dumps(obj, ensure_ascii=False)
+
+# run() reports through callbacks so server.py can drive it in-process; the CLI prints them.
+LogFn = Callable[[str], None]
+ProgressFn = Callable[[Optional[int], str], None]  # pct None: update the message only
+OutputFn = Callable[[Path], None]
 
 def log(msg: str): print(msg, flush=True)
-def progress(pct: int, msg: str): print(f"PROGRESS {json.dumps({'pct': int(pct), 'msg': msg})}", flush=True)
+def progress(pct: Optional[int], msg: str):
+    payload = {"msg": msg} if pct is None else {"pct": int(pct), "msg": msg}
+    print(f"PROGRESS {json_dumps(payload)}", flush=True)
+
+def last_page(resp: requests.Response) -> Optional[int]:
+    m = LINK_LAST_RE.search(resp.headers.get("Link", ""))
+    if not m: return None
+    page = parse_qs(urlparse(m.group(1)).query).get("page")
+    return int(page[0]) if page else None
+
+class RepoProgress:
+    """Folds per-repo completion (0..1) into one PROGRESS pct while repos run concurrently."""
+    def __init__(self, repos: List[str], start: int, span: int, on_progress: ProgressFn):
+        self.frac = {r: 0.0 for r in repos}
+        self.start, self.span, self.on_progress = start, span, on_progress
+        self._lock = threading.Lock()
+
+    def update(self, repo: str, frac: float, msg: str):
+        with self._lock:
+            self.frac[repo] = frac
+            pct = self.start + int(self.span * sum(self.frac.values()) / max(1, len(self.frac)))
+            self.on_progress(pct, msg)
+
+class ETagCache:
+    """(url, params) -> (ETag, body file) in SQLite; bodies stored content-addressed on disk.
+
+    Link is deliberately not kept: a 304 vouches for this page's body only, not for how many pages
+    follow it (an oldest-first list keeps page 1 while growing). The `link` column stays for caches
+    written by earlier versions and is filled with "".
+    """
+    def __init__(self, root: Path):
+        # Private-repo payloads land here: keep the directory owner-only.
+        root.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.bodies = root / "bodies"
+        self.bodies.mkdir(mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(root / "etags.sqlite"), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS etags "
+                             "(key TEXT PRIMARY KEY, etag TEXT NOT NULL, link TEXT NOT NULL, body TEXT NOT NULL)")
+            cols = {r[1] for r in self._db.execute("PRAGMA table_info(etags)")}
+            if "size" not in cols: self._db.execute("ALTER TABLE etags ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            if "used" not in cols: self._db.execute("ALTER TABLE etags ADD COLUMN used REAL NOT NULL DEFAULT 0")
+        self.prune()
+
+    def prune(self, max_age: float = CACHE_MAX_AGE, max_bytes: int = CACHE_MAX_BYTES):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM etags WHERE used < ?", (now - max_age,))
+            total, evict = 0, []
+            for key, size in self._db.execute("SELECT key, size FROM etags ORDER BY used DESC"):
+                total += size
+                if total > max_bytes: evict.append((key,))
+            self._db.executemany("DELETE FROM etags WHERE key = ?", evict)
+            live = {r[0] for r in self._db.execute("SELECT DISTINCT body FROM etags")}
+        # Sweep unreferenced bodies; skip fresh files another job may still be writing or inserting.
+        for f in self.bodies.iterdir():
+            try:
+                if f.name not in live and f.stat().st_mtime < now - 3600: f.unlink()
+            except OSError:
+                pass
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]]) -> str:
+        return f"{url}?{urlencode(sorted((params or {}).items()), doseq=True)}"
+
+    def lookup(self, key: str) -> Optional[Tuple[str, Path]]:
+        with self._lock:
+            row = self._db.execute("SELECT etag, body FROM etags WHERE key = ?", (key,)).fetchone()
+        if not row: return None
+        body = self.bodies / row[1]
+        return (row[0], body) if body.exists() else None
+
+    def store(self, key: str, resp: requests.Response):
+        digest = hashlib.sha256(resp.content).hexdigest()
+        body = self.bodies / digest
+        if not body.exists():
+            tmp = body.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(resp.content)
+            tmp.replace(body)
+        with self._lock, self._db:
+            old = self._db.execute("SELECT body FROM etags WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO etags (key, etag, link, body, size, used) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, resp.headers["ETag"], "", digest,
+                              len(resp.content), time.time()))
+            # The page changed: drop its previous body unless another key shares that content.
+            stale = old and old[0] != digest and not self._db.execute(
+                "SELECT 1 FROM etags WHERE body = ? LIMIT 1", (old[0],)).fetchone()
+        if stale: (self.bodies / old[0]).unlink(missing_ok=True)
+
+    def touch(self, key: str):
+        with self._lock, self._db:
+            self._db.execute("UPDATE etags SET used = ? WHERE key = ?", (time.time(), key))
+
+    @staticmethod
+    def replay(resp: requests.Response, body: Path) -> requests.Response:
+        # Turn the 304 into the 200 it stands for, so callers' body handling keeps working.
+        resp.status_code = 200
+        resp._content = body.read_bytes()
+        return resp
 
 class GitHubAPI:
-    def __init__(self, token: str, base_url: str = "https://api.github.com", verbose: bool = False):
+    def __init__(self, token: str, base_url: str = "https://api.github.com", verbose: bool = False,
+                 cache_dir: Optional[Path] = None, on_log: LogFn = log, on_progress: Optional[ProgressFn] = None,
+                 cancel: Optional[threading.Event] = None):
         token = token.strip().strip('"').strip("'")
         self.base_url = base_url.rstrip("/")
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, pool_block=False, max_retries=RETRY)
+        self.session.mount("https://", adapter)
         self.session.headers.update({
             "Authorization": f"Bearer {token}",
             "Accept": "application/vnd.github.v3+json",
             "X-GitHub-Api-Version": "2022-11-28",
         })
         self.verbose = verbose
+        self.on_log = on_log
+        self.on_progress = on_progress
+        # Set by the embedding server on shutdown: pending requests and rate-limit sleeps bail out.
+        self.cancel = cancel or threading.Event()
+        self.etags: Optional[ETagCache] = None
+        if cache_dir:
+            try:
+                self.etags = ETagCache(cache_dir)
+            except (OSError, sqlite3.Error) as e:  # e.g. read-only $HOME: run uncached rather than fail
+                self.on_log(f"[cache] disabled, cannot open {cache_dir}: {e}")
+        # Caps in-flight requests across every thread (repo x PR x page fan-outs) sharing this client.
+        self._inflight = threading.BoundedSemaphore(POOL_MAXSIZE)
 
     def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
         url = f"{self.base_url}{endpoint}"
         if self.verbose:
-            log(f"GET {url}  params={params or {}}")
-        resp = self.session.get(url, params=params, timeout=60)
-        if resp.status_code == 403 and "X-RateLimit-Remaining" in resp.headers:
-            remaining = int(resp.headers.get("X-RateLimit-Remaining", "0"))
-            if remaining == 0 and "X-RateLimit-Reset" in resp.headers:
-                reset = int(resp.headers["X-RateLimit-Reset"])
-                sleep_for = max(0, reset - int(time.time()) + 1)
-                log(f"[rate limit] sleeping {sleep_for}s until reset...")
-                time.sleep(sleep_for)
-                return self.session.get(url, params=params, timeout=60)
+            self.on_log(f"GET {url}  params={params or {}}")
+        key = self.etags.key(url, params) if self.etags else None
+        cached = self.etags.lookup(key) if key else None
+        headers = {"If-None-Match": cached[0]} if cached else None
+        resp = self._send(url, params, headers)
+        if resp.status_code in (403, 429) and self._wait_for_rate_limit(resp):
+            resp = self._send(url, params, headers)
+        if resp.status_code == 304 and cached:
+            self.etags.touch(key)
+            return self.etags.replay(resp, cached[1])
         resp.raise_for_status()
+        if key and resp.headers.get("ETag"):
+            self.etags.store(key, resp)
         return resp
 
+    def _send(self, url: str, params: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]]) -> requests.Response:
+        self._check_cancel()
+        with self._inflight:
+            return self.session.get(url, params=params, headers=headers, timeout=60)
+
+    def _check_cancel(self):
+        if self.cancel.is_set(): raise RuntimeError("cancelled: server shutting down")
+
+    def _wait_for_rate_limit(self, resp: requests.Response) -> bool:
+        h = resp.headers
+        retry_after = h.get("Retry-After", "")
+        if retry_after.isdigit():  # secondary (abuse) limit
+            self._sleep(int(retry_after), "secondary rate limit")
+            return True
+        if "X-RateLimit-Remaining" in h and int(h["X-RateLimit-Remaining"]) == 0 and "X-RateLimit-Reset" in h:
+            self._sleep(max(0, int(h["X-RateLimit-Reset"]) - int(time.time()) + 1), "rate limit")
+            return True
+        return False
+
+    def _sleep(self, seconds: int, reason: str):
+        self.on_log(f"[{reason}] sleeping {seconds}s until reset...")
+        end = time.time() + seconds
+        while (left := end - time.time()) > 0:
+            if self.on_progress:  # no pct: keep the current bar and just update the message
+                self.on_progress(None, f"{reason}: resuming in {int(left)}s")
+            if self.cancel.wait(min(30.0, left)): self._check_cancel()
+
     def get_all(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         params = dict(params or {})
         params.setdefault("per_page", 100)
+        params["page"] = 1
+        resp = self._get(endpoint, params=params)
+        out: List[Dict[str, Any]] = list(json_loads(resp.content) or [])
+        last = last_page(resp)
+        if last and last > 1:
+            # Page count known up front: fetch 2..last concurrently (ex.map keeps page order).
+            def fetch(page: int) -> List[Dict[str, Any]]:
+                return json_loads(self._get(endpoint, params={**params, "page": page}).content) or []
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, last - 1)) as ex:
+                for data in ex.map(fetch, range(2, last + 1)):
+                    out.extend(data)
+            return out
+        # No Link header (including a 304-replayed page 1, whose Link isn't cached): walk pages until a
+        # short one. Each page is then revalidated on its own, so growth past the old last page is seen.
         page = 1
-        out: List[Dict[str, Any]] = []
-        while True:
+        data = out
+        while len(data) >= params["per_page"]:
+            page += 1
             params["page"] = page
-            data = self._get(endpoint, params=params).json()
-            if not data:
-                break
+            data = json_loads(self._get(endpoint, params=params).content)
+            if not data: break
             out.extend(data)
-            if len(data) < params["per_page"]:
-                break
-            page += 1
         return out
 
     def list_commits_for_path(self, org: str, repo: str, path: str,
@@ -61,7 +258,22 @@ class GitHubAPI:
         return self.get_all(f"/repos/{org}/{repo}/commits", params=params)
 
     def get_commit(self, org: str, repo: str, sha: str) -> Dict[str, Any]:
-        return self._get(f"/repos/{org}/{repo}/commits/{sha}").json()
+        return json_loads(self._get(f"/repos/{org}/{repo}/commits/{sha}").content)
+
+    def get_commit_files(self, org: str, repo: str, shas: List[str], file_path: str) -> Iterator[Dict[str, Any]]:
+        """`file_path`'s record in each commit ({} if untouched), yielded in input order.
+
+        Workers keep only that record (a detail can carry 300 files with patches), and at most
+        2 x MAX_WORKERS fetches are queued ahead of the consumer, so a slow one can't pile up results.
+        """
+        def fetch(sha: str) -> Dict[str, Any]:
+            return file_record(self.get_commit(org, repo, sha), file_path) or {}
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            window: Deque[Future] = deque()
+            for sha in shas:
+                window.append(ex.submit(fetch, sha))
+                if len(window) >= 2 * MAX_WORKERS: yield window.popleft().result()
+            while window: yield window.popleft().result()
 
 def normalize_iso(s: Optional[str]) -> Optional[str]:
     if not s: return None
@@ -72,8 +284,15 @@ def normalize_iso(s: Optional[str]) -> Optional[str]:
     except Exception:
         raise SystemExit(f"Invalid date format: {s}. Use YYYY-MM-DD or full ISO.")
 
+def file_record(commit_detail: Dict[str, Any], file_path: str) -> Optional[Dict[str, Any]]:
+    for f in commit_detail.get("files") or []:
+        if f.get("filename") == file_path or f.get("previous_filename") == file_path:
+            return f
+    return None
+
 def csv_row_from_commit(org: str, repo: str, file_path: str,
-                        commit_summary: Dict[str, Any], commit_detail: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+                        commit_summary: Dict[str, Any],
+                        file_rec: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     sha = commit_summary.get("sha", "")
     html_url = commit_summary.get("html_url", "")
     commit_url = f"https://github.com/{org}/{repo}/commit/{sha}"
@@ -89,39 +308,45 @@ def csv_row_from_commit(org: str, repo: str, file_path: str,
 
     committer_login = (commit_summary.get("committer") or {}).get("login", "")
 
-    files = commit_detail.get("files") or []
-    file_rec = None
-    for f in files:
-        if f.get("filename") == file_path or f.get("previous_filename") == file_path:
-            file_rec = f
-            break
-    if not file_rec:
-        return None
-
-    return {
+    row = {
         "repo": repo, "file_path": file_path, "commit_sha": sha,
         "html_url": html_url, "commit_url": commit_url, "commit_date": commit_date,
         "author_login": author_login, "author_name": author_name, "author_email": author_email,
         "committer_login": committer_login, "message": message,
+        "status": "", "previous_filename": "", "additions": "", "deletions": "", "changes": "",
+    }
+    # No detail (--no-file-stats): trust the server-side path filter and leave file stats blank.
+    if file_rec is None:
+        return row
+    if not file_rec:  # {}: the commit's file list doesn't include file_path
+        return None
+
+    row.update({
         "status": file_rec.get("status",""), "previous_filename": file_rec.get("previous_filename",""),
         "additions": file_rec.get("additions",0), "deletions": file_rec.get("deletions",0),
         "changes": file_rec.get("changes",0),
-    }
+    })
+    return row
+
+# csv_row_from_commit() always fills every column, so a plain itemgetter replaces DictWriter's per-key lookups.
+CSV_FIELDS = ("repo","file_path","commit_sha","html_url","commit_url","commit_date","author_login","author_name",
+              "author_email","committer_login","message","status","previous_filename","additions","deletions","changes")
+row_tuple = operator.itemgetter(*CSV_FIELDS)
 
-def write_repo_csv(rows: List[Dict[str, Any]], output_dir: Path, repo: str, file_path: str) -> Path:
+def write_repo_csv(rows: Iterable[Dict[str, Any]], output_dir: Path, repo: str, file_path: str) -> Tuple[Path, int]:
+    # Rows are written as they are produced (flat memory). The commits endpoint already returns
+    # newest-first, so no re-sort is needed; the caller reports the path only once the file is complete.
     output_dir.mkdir(parents=True, exist_ok=True)
     safe_suffix = file_path.strip("/").replace("/", "-")
     outpath = output_dir / f"{repo}-{safe_suffix}-file-history.csv"
-    fields = ["repo","file_path","commit_sha","html_url","commit_url","commit_date","author_login","author_name",
-              "author_email","committer_login","message","status","previous_filename","additions","deletions","changes"]
+    n = 0
     with outpath.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fields); w.writeheader()
-        def _key(r): return r.get("commit_date") or ""
-        for r in sorted(rows, key=_key, reverse=True): w.writerow(r)
-    log(f"OUTPUT_CSV {outpath}")
-    return outpath
+        w = csv.writer(f); w.writerow(CSV_FIELDS)
+        for r in rows:
+            w.writerow(row_tuple(r)); n += 1
+    return outpath, n
 
-def main() -> int:
+def build_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser(description="Extract per-file commit history for specified repositories.")
     ap.add_argument("--token")
     ap.add_argument("--org", default="name-of-organisation")
@@ -129,74 +354,107 @@ def main() -> int:
     ap.add_argument("--file-path", required=True)
     ap.add_argument("--output-dir", default="output")
     ap.add_argument("--since"); ap.add_argument("--until"); ap.add_argument("--sha")
+    ap.add_argument("--no-file-stats", action="store_true",
+                    help="Skip the per-commit detail request (one API call per commit). Rows keep commit "
+                         "metadata but status/previous_filename/additions/deletions/changes are left blank.")
     ap.add_argument("--verbose", action="store_true")
     ap.add_argument("--emit-progress", action="store_true")
     ap.add_argument("--audit-log")
-    args = ap.parse_args()
+    ap.add_argument("--cache-dir", default=str(CACHE_DIR), help="ETag cache for conditional requests.")
+    ap.add_argument("--no-cache", action="store_true", help="Disable the ETag cache (always re-download).")
+    return ap
+
+MISSING_TOKEN = "Error: GitHub token is required (pass --token or set GITHUB_TOKEN)."
 
+def run(args: argparse.Namespace, on_progress: ProgressFn, on_output: OutputFn, on_log: LogFn = log,
+        cancel: Optional[threading.Event] = None) -> int:
+    """Run an extraction for parsed `args`, reporting progress, written CSVs and log lines via callbacks."""
     token = args.token or os.environ.get("GITHUB_TOKEN")
     if not token:
-        print("Error: GitHub token is required (pass --token or set GITHUB_TOKEN).", file=sys.stderr, flush=True)
+        on_log(MISSING_TOKEN)
         return 1
 
     since_iso = normalize_iso(args.since)
     until_iso = normalize_iso(args.until)
+    repos = list(dict.fromkeys(args.repos))  # a repeated name would race two threads onto one CSV
     apply_window = (since_iso is not None) or (until_iso is not None)
 
-    log("\n=== Filters ===")
-    log("  type:        commits (per-file)")
-    log(f"  org:         {args.org}")
-    log(f"  repos:       {', '.join(args.repos)}")
-    log(f"  file_path:   {args.file_path}")
-    if args.sha: log(f"  sha:         {args.sha}")
-    if apply_window: log(f"  date:        {since_iso or '-inf'}  ->  {until_iso or '+inf'}")
-    else: log("  date:        ALL TIME (no date window)")
-    log("===============\n")
-
-    gh = GitHubAPI(token=token, verbose=args.verbose)
+    on_log("\n=== Filters ===")
+    on_log("  type:        commits (per-file)")
+    on_log(f"  org:         {args.org}")
+    on_log(f"  repos:       {', '.join(repos)}")
+    on_log(f"  file_path:   {args.file_path}")
+    if args.sha: on_log(f"  sha:         {args.sha}")
+    if args.no_file_stats: on_log("  file stats:  skipped (--no-file-stats)")
+    if apply_window: on_log(f"  date:        {since_iso or '-inf'}  ->  {until_iso or '+inf'}")
+    else: on_log("  date:        ALL TIME (no date window)")
+    on_log("===============\n")
+
+    gh = GitHubAPI(token=token, verbose=args.verbose,
+                   cache_dir=None if args.no_cache else Path(args.cache_dir), on_log=on_log, on_progress=on_progress,
+                   cancel=cancel)
     out_dir = Path(args.output_dir)
     total_rows = 0
     t0 = time.time()
 
-    if args.emit_progress: progress(1, "Listing commits...")
+    on_progress(1, "Listing commits...")
+    tracker = RepoProgress(repos, start=10, span=80, on_progress=on_progress)
 
-    for repo in args.repos:
-        log(f"[{repo}] listing commits touching {args.file_path}...")
+    def process_repo(repo: str) -> Tuple[str, int]:
+        on_log(f"[{repo}] listing commits touching {args.file_path}...")
         commits = gh.list_commits_for_path(org=args.org, repo=repo, path=args.file_path,
                                            since_iso=since_iso, until_iso=until_iso, sha=args.sha)
-        if args.emit_progress: progress(10, f"{repo}: {len(commits)} commits found")
+        tracker.update(repo, 0.0, f"{repo}: {len(commits)} commits found")
 
-        rows: List[Dict[str, Any]] = []
+        commits = [c for c in commits if c.get("sha")]
         N = max(1, len(commits))
-        for i, c in enumerate(commits, start=1):
-            sha = c.get("sha")
-            if not sha: continue
-            detail = gh.get_commit(args.org, repo, sha)
-            row = csv_row_from_commit(args.org, repo, args.file_path, c, detail)
-            if row: rows.append(row)
-            if args.emit_progress:
-                pct = 10 + int(80 * (i / N))
-                progress(pct, f"{repo}: processing {i}/{N}")
+        def rows() -> Iterator[Dict[str, Any]]:
+            file_recs: Iterable[Optional[Dict[str, Any]]]
+            if args.no_file_stats:
+                file_recs = itertools.repeat(None)
+            else:
+                file_recs = gh.get_commit_files(args.org, repo, [c["sha"] for c in commits], args.file_path)
+            for i, (c, file_rec) in enumerate(zip(commits, file_recs), start=1):
+                row = csv_row_from_commit(args.org, repo, args.file_path, c, file_rec)
+                if row: yield row
+                tracker.update(repo, i / N, f"{repo}: processing {i}/{N}")
+
+        path, n = write_repo_csv(rows(), out_dir, repo, args.file_path)
+        on_output(path)
+        tracker.update(repo, 1.0, f"{repo}: wrote {n} rows")
+        return repo, n
 
-        write_repo_csv(rows, out_dir, repo, args.file_path)
-        total_rows += len(rows)
+    # Repos are independent; they share gh (one session, pool and rate-limit budget).
+    with ThreadPoolExecutor(max_workers=max(1, min(REPO_WORKERS, len(repos)))) as ex:
+        for fut in as_completed([ex.submit(process_repo, r) for r in repos]):
+            _, n = fut.result()
+            total_rows += n
 
-    if args.emit_progress: progress(100, "Completed")
+    on_progress(100, "Completed")
 
     if args.audit_log:
         try:
             with open(args.audit_log, "a", encoding="utf-8") as f:
-                f.write(json.dumps({
+                f.write(json_dumps({
                     "ts": time.time(), "tool": "file-commit-history",
-                    "params": {"org": args.org, "repos": args.repos, "file_path": args.file_path,
-                               "since": args.since, "until": args.until, "sha": args.sha},
+                    "params": {"org": args.org, "repos": repos, "file_path": args.file_path,
+                               "since": args.since, "until": args.until, "sha": args.sha,
+                               "file_stats": not args.no_file_stats},
                     "rows_written": total_rows, "duration_sec": time.time() - t0,
                 }) + "\n")
         except Exception:
             pass
 
-    log(f"\nDone. Rows written: {total_rows}")
+    on_log(f"\nDone. Rows written: {total_rows}")
     return 0
 
+def main() -> int:
+    args = build_parser().parse_args()
+    if not (args.token or os.environ.get("GITHUB_TOKEN")):  # CLI usage error: stderr, as before run() existed
+        print(MISSING_TOKEN, file=sys.stderr, flush=True)
+        return 1
+    on_progress: ProgressFn = progress if args.emit_progress else (lambda pct, msg: None)
+    return run(args, on_progress, lambda path: log(f"OUTPUT_CSV {path}"))
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -1,90 +1,379 @@
 #!/usr/bin/env python3
-import os, sys, csv, time, json, argparse, datetime as dt
+import os, re, sys, csv, time, json, sqlite3, hashlib, inspect, argparse, operator, threading, datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+from urllib.parse import urlparse, parse_qs, urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# Concurrent GETs per fan-out; well under GitHub's secondary (abuse) limit of ~100 in flight.
+MAX_WORKERS = 8
+# Repos extracted side by side; each still runs its own MAX_WORKERS fan-out.
+REPO_WORKERS = 4
+# `Link: <...&page=N>; rel="last"` on the first page tells us how many pages to fan out.
+LINK_LAST_RE = re.compile(r'<([^>]+)>;\s*rel="last"')
+# Keep-alive pool per host; sized above the worker count so nested fan-outs never open fresh TLS sessions.
+POOL_MAXSIZE = 32
+# GraphQL v4: one request returns up to GRAPHQL_PAGE PRs with their commit/review counts.
+GRAPHQL_PAGE = 50
+PR_QUERY = """
+query($owner: String!, $name: String!, $states: [PullRequestState!], $first: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(first: $first, after: $cursor, states: $states, orderBy: {field: UPDATED_AT, direction: DESC}) {
+      totalCount
+      pageInfo { endCursor hasNextPage }
+      nodes {
+        number title state createdAt updatedAt mergedAt url body
+        author { login }
+        mergeCommit { oid }
+        commits { totalCount }
+        reviews { totalCount }
+      }
+    }
+  }
+}
+"""
+# Transient failures (timeouts, 429, 5xx) back off geometrically with jitter, honouring Retry-After.
+# raise_on_status=False hands the final response to raise_for_status / the rate-limit path in _get.
+# backoff_jitter only exists from urllib3 2.0; on 1.26 the backoff is plain geometric.
+RETRY_JITTER = {"backoff_jitter": 0.5} if "backoff_jitter" in inspect.signature(Retry).parameters else {}
+RETRY = Retry(total=6, backoff_factor=2.0, status_forcelist={429, 500, 502, 503, 504}, allowed_methods={"GET"},
+              respect_retry_after_header=True, raise_on_status=False, **RETRY_JITTER)
+# GraphQL reads go out as POST; the queries are read-only, so they are as safe to retry as GETs.
+GRAPHQL_RETRY = RETRY.new(allowed_methods={"POST"})
+# Without a Retry-After or exhausted X-RateLimit headers, wait this long on a GraphQL RATE_LIMITED error.
+GRAPHQL_RATE_LIMIT_WAIT = 60
+# Conditional-request cache; 304 Not Modified replies don't count against the primary rate limit.
+CACHE_DIR = Path(os.environ.get("GH_EXTRACTOR_CACHE") or Path.home() / ".cache" / "gh-extractor")
+# On open, entries unused for CACHE_MAX_AGE seconds are dropped, then the least recently used past CACHE_MAX_BYTES.
+CACHE_MAX_AGE = 30 * 24 * 3600
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+try:
+    import orjson  # optional: 3-5x faster parse/emit than stdlib json on API payloads
+except ImportError:
+    orjson = None
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def json_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode() if orjson else json.dumps(obj, ensure_ascii=False)
+
+# run() reports through callbacks so server.py can drive it in-process; the CLI prints them.
+LogFn = Callable[[str], None]
+ProgressFn = Callable[[Optional[int], str], None]  # pct None: update the message only
+OutputFn = Callable[[Path], None]
 
 def log(msg: str): print(msg, flush=True)
-def progress(pct: int, msg: str): print(f"PROGRESS {json.dumps({'pct': int(pct), 'msg': msg})}", flush=True)
+def progress(pct: Optional[int], msg: str):
+    payload = {"msg": msg} if pct is None else {"pct": int(pct), "msg": msg}
+    print(f"PROGRESS {json_dumps(payload)}", flush=True)
+
+def last_page(resp: requests.Response) -> Optional[int]:
+    m = LINK_LAST_RE.search(resp.headers.get("Link", ""))
+    if not m: return None
+    page = parse_qs(urlparse(m.group(1)).query).get("page")
+    return int(page[0]) if page else None
+
+class RepoProgress:
+    """Folds per-repo completion (0..1) into one PROGRESS pct while repos run concurrently."""
+    def __init__(self, repos: List[str], start: int, span: int, on_progress: ProgressFn):
+        self.frac = {r: 0.0 for r in repos}
+        self.start, self.span, self.on_progress = start, span, on_progress
+        self._lock = threading.Lock()
+
+    def update(self, repo: str, frac: float, msg: str):
+        with self._lock:
+            self.frac[repo] = frac
+            pct = self.start + int(self.span * sum(self.frac.values()) / max(1, len(self.frac)))
+            self.on_progress(pct, msg)
+
+class ETagCache:
+    """(url, params) -> (ETag, body file) in SQLite; bodies stored content-addressed on disk.
+
+    Link is deliberately not kept: a 304 vouches for this page's body only, not for how many pages
+    follow it (an oldest-first list keeps page 1 while growing). The `link` column stays for caches
+    written by earlier versions and is filled with "".
+    """
+    def __init__(self, root: Path):
+        # Private-repo payloads land here: keep the directory owner-only.
+        root.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.bodies = root / "bodies"
+        self.bodies.mkdir(mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(root / "etags.sqlite"), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS etags "
+                             "(key TEXT PRIMARY KEY, etag TEXT NOT NULL, link TEXT NOT NULL, body TEXT NOT NULL)")
+            cols = {r[1] for r in self._db.execute("PRAGMA table_info(etags)")}
+            if "size" not in cols: self._db.execute("ALTER TABLE etags ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            if "used" not in cols: self._db.execute("ALTER TABLE etags ADD COLUMN used REAL NOT NULL DEFAULT 0")
+        self.prune()
+
+    def prune(self, max_age: float = CACHE_MAX_AGE, max_bytes: int = CACHE_MAX_BYTES):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM etags WHERE used < ?", (now - max_age,))
+            total, evict = 0, []
+            for key, size in self._db.execute("SELECT key, size FROM etags ORDER BY used DESC"):
+                total += size
+                if total > max_bytes: evict.append((key,))
+            self._db.executemany("DELETE FROM etags WHERE key = ?", evict)
+            live = {r[0] for r in self._db.execute("SELECT DISTINCT body FROM etags")}
+        # Sweep unreferenced bodies; skip fresh files another job may still be writing or inserting.
+        for f in self.bodies.iterdir():
+            try:
+                if f.name not in live and f.stat().st_mtime < now - 3600: f.unlink()
+            except OSError:
+                pass
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]]) -> str:
+        return f"{url}?{urlencode(sorted((params or {}).items()), doseq=True)}"
+
+    def lookup(self, key: str) -> Optional[Tuple[str, Path]]:
+        with self._lock:
+            row = self._db.execute("SELECT etag, body FROM etags WHERE key = ?", (key,)).fetchone()
+        if not row: return None
+        body = self.bodies / row[1]
+        return (row[0], body) if body.exists() else None
+
+    def store(self, key: str, resp: requests.Response):
+        digest = hashlib.sha256(resp.content).hexdigest()
+        body = self.bodies / digest
+        if not body.exists():
+            tmp = body.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(resp.content)
+            tmp.replace(body)
+        with self._lock, self._db:
+            old = self._db.execute("SELECT body FROM etags WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO etags (key, etag, link, body, size, used) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, resp.headers["ETag"], "", digest,
+                              len(resp.content), time.time()))
+            # The page changed: drop its previous body unless another key shares that content.
+            stale = old and old[0] != digest and not self._db.execute(
+                "SELECT 1 FROM etags WHERE body = ? LIMIT 1", (old[0],)).fetchone()
+        if stale: (self.bodies / old[0]).unlink(missing_ok=True)
+
+    def touch(self, key: str):
+        with self._lock, self._db:
+            self._db.execute("UPDATE etags SET used = ? WHERE key = ?", (time.time(), key))
+
+    @staticmethod
+    def replay(resp: requests.Response, body: Path) -> requests.Response:
+        # Turn the 304 into the 200 it stands for, so callers' body handling keeps working.
+        resp.status_code = 200
+        resp._content = body.read_bytes()
+        return resp
 
 class GitHubAPI:
-    def __init__(self, token: str, base_url: str = "https://api.github.com", verbose: bool = False):
+    def __init__(self, token: str, base_url: str = "https://api.github.com", verbose: bool = False,
+                 cache_dir: Optional[Path] = None, on_log: LogFn = log, on_progress: Optional[ProgressFn] = None,
+                 cancel: Optional[threading.Event] = None):
         token = token.strip().strip('"').strip("'")
         self.base_url = base_url.rstrip("/")
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, pool_block=False, max_retries=RETRY)
+        self.session.mount("https://", adapter)
+        self.session.mount(f"{self.base_url}/graphql", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE,
+                                                                   pool_block=False, max_retries=GRAPHQL_RETRY))
         self.session.headers.update({
             "Authorization": f"Bearer {token}",
             "Accept": "application/vnd.github.v3+json",
             "X-GitHub-Api-Version": "2022-11-28",
         })
         self.verbose = verbose
+        self.on_log = on_log
+        self.on_progress = on_progress
+        # Set by the embedding server on shutdown: pending requests and rate-limit sleeps bail out.
+        self.cancel = cancel or threading.Event()
+        self.etags: Optional[ETagCache] = None
+        if cache_dir:
+            try:
+                self.etags = ETagCache(cache_dir)
+            except (OSError, sqlite3.Error) as e:  # e.g. read-only $HOME: run uncached rather than fail
+                self.on_log(f"[cache] disabled, cannot open {cache_dir}: {e}")
+        # Caps in-flight requests across every thread (repo x PR x page fan-outs) sharing this client.
+        self._inflight = threading.BoundedSemaphore(POOL_MAXSIZE)
 
-    def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+    def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+             use_cache: bool = True) -> requests.Response:
         url = f"{self.base_url}{endpoint}"
         if self.verbose:
-            log(f"GET {url}  params={params or {}}")
-        resp = self.session.get(url, params=params, timeout=60)
-        if resp.status_code == 403 and "X-RateLimit-Remaining" in resp.headers:
-            remaining = int(resp.headers.get("X-RateLimit-Remaining", "0"))
-            if remaining == 0 and "X-RateLimit-Reset" in resp.headers:
-                reset = int(resp.headers["X-RateLimit-Reset"])
-                sleep_for = max(0, reset - int(time.time()) + 1)
-                log(f"[rate limit] sleeping {sleep_for}s until reset...")
-                time.sleep(sleep_for)
-                return self.session.get(url, params=params, timeout=60)
+            self.on_log(f"GET {url}  params={params or {}}")
+        key = self.etags.key(url, params) if self.etags and use_cache else None
+        cached = self.etags.lookup(key) if key else None
+        headers = {"If-None-Match": cached[0]} if cached else None
+        resp = self._send(url, params, headers)
+        if resp.status_code in (403, 429) and self._wait_for_rate_limit(resp):
+            resp = self._send(url, params, headers)
+        if resp.status_code == 304 and cached:
+            self.etags.touch(key)
+            return self.etags.replay(resp, cached[1])
         resp.raise_for_status()
+        if key and resp.headers.get("ETag"):
+            self.etags.store(key, resp)
         return resp
 
+    def _send(self, url: str, params: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]]) -> requests.Response:
+        self._check_cancel()
+        with self._inflight:
+            return self.session.get(url, params=params, headers=headers, timeout=60)
+
+    def _check_cancel(self):
+        if self.cancel.is_set(): raise RuntimeError("cancelled: server shutting down")
+
+    def _wait_for_rate_limit(self, resp: requests.Response) -> bool:
+        h = resp.headers
+        retry_after = h.get("Retry-After", "")
+        if retry_after.isdigit():  # secondary (abuse) limit
+            self._sleep(int(retry_after), "secondary rate limit")
+            return True
+        if "X-RateLimit-Remaining" in h and int(h["X-RateLimit-Remaining"]) == 0 and "X-RateLimit-Reset" in h:
+            self._sleep(max(0, int(h["X-RateLimit-Reset"]) - int(time.time()) + 1), "rate limit")
+            return True
+        return False
+
+    def _sleep(self, seconds: int, reason: str):
+        self.on_log(f"[{reason}] sleeping {seconds}s until reset...")
+        end = time.time() + seconds
+        while (left := end - time.time()) > 0:
+            if self.on_progress:  # no pct: keep the current bar and just update the message
+                self.on_progress(None, f"{reason}: resuming in {int(left)}s")
+            if self.cancel.wait(min(30.0, left)): self._check_cancel()
+
     def get_all(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         params = dict(params or {})
         params.setdefault("per_page", 100)
+        params["page"] = 1
+        resp = self._get(endpoint, params=params)
+        out: List[Dict[str, Any]] = list(json_loads(resp.content) or [])
+        last = last_page(resp)
+        if last and last > 1:
+            # Page count known up front: fetch 2..last concurrently (ex.map keeps page order).
+            def fetch(page: int) -> List[Dict[str, Any]]:
+                return json_loads(self._get(endpoint, params={**params, "page": page}).content) or []
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, last - 1)) as ex:
+                for data in ex.map(fetch, range(2, last + 1)):
+                    out.extend(data)
+            return out
+        # No Link header (including a 304-replayed page 1, whose Link isn't cached): walk pages until a
+        # short one. Each page is then revalidated on its own, so growth past the old last page is seen.
         page = 1
-        out: List[Dict[str, Any]] = []
-        while True:
+        data = out
+        while len(data) >= params["per_page"]:
+            page += 1
             params["page"] = page
-            data = self._get(endpoint, params=params).json()
+            data = json_loads(self._get(endpoint, params=params).content)
             if not data: break
             out.extend(data)
-            if len(data) < params["per_page"]: break
-            page += 1
         return out
 
+    def graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        url = f"{self.base_url}/graphql"
+        if self.verbose:
+            self.on_log(f"POST {url}  variables={variables}")
+        payload = {"query": query, "variables": variables}
+        def post() -> requests.Response:
+            self._check_cancel()
+            with self._inflight:
+                return self.session.post(url, json=payload, timeout=60)
+        resp = post()
+        if resp.status_code in (403, 429) and self._wait_for_rate_limit(resp):
+            resp = post()
+        resp.raise_for_status()
+        body = json_loads(resp.content)
+        # GraphQL reports its rate limit as a 200 with errors[].type == "RATE_LIMITED": wait, then retry once.
+        if any(e.get("type") == "RATE_LIMITED" for e in body.get("errors") or []):
+            if not self._wait_for_rate_limit(resp):
+                self._sleep(GRAPHQL_RATE_LIMIT_WAIT, "graphql rate limit")
+            resp = post()
+            resp.raise_for_status()
+            body = json_loads(resp.content)
+        if body.get("errors"):
+            raise RuntimeError(f"GraphQL error: {body['errors']}")
+        return body["data"]
+
     # --- Endpoints ---
     def list_repo_prs(self, org: str, repo: str, state: str = "closed") -> List[Dict[str, Any]]:
         return self.get_all(f"/repos/{org}/{repo}/pulls",
                             {"state": state, "sort": "updated", "direction": "desc"})
 
-    def list_pr_commits(self, org: str, repo: str, number: int) -> List[Dict[str, Any]]:
-        return self.get_all(f"/repos/{org}/{repo}/pulls/{number}/commits")
+    def count(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> int:
+        # With per_page=1 the rel="last" page number is the item count; no Link means 0 or 1 items.
+        # Uncached: a 304 only vouches for item 1, and oldest-first lists keep it while growing.
+        resp = self._get(endpoint, params={**(params or {}), "per_page": 1}, use_cache=False)
+        last = last_page(resp)
+        return last if last is not None else len(json_loads(resp.content) or [])
+
+    def get_pr(self, org: str, repo: str, number: int) -> Dict[str, Any]:
+        # The detailed PR object carries `commits` (count), so no need to walk /pulls/{n}/commits.
+        return json_loads(self._get(f"/repos/{org}/{repo}/pulls/{number}").content)
+
+    def count_pr_commits(self, org: str, repo: str, number: int) -> int:
+        return int(self.get_pr(org, repo, number).get("commits") or 0)
+
+    def count_pr_reviews(self, org: str, repo: str, number: int) -> int:
+        return self.count(f"/repos/{org}/{repo}/pulls/{number}/reviews")
 
-    def list_pr_reviews(self, org: str, repo: str, number: int) -> List[Dict[str, Any]]:
-        return self.get_all(f"/repos/{org}/{repo}/pulls/{number}/reviews")
+    def list_prs_graphql(self, org: str, repo: str, states: List[str], stop_before: Optional[float] = None,
+                         on_page: Optional[Callable[[int, int], None]] = None) -> List[Tuple[Dict[str, Any], int, int]]:
+        """(REST-shaped PR, commits count, reviews count), newest-updated first.
 
-    def search_merged_prs(self, org: str, repo: str, since_iso: str, until_iso: str) -> List[Dict[str, Any]]:
-        # GitHub Search API for issues/PRs: filter by merged range
-        # q: repo:org/repo is:pr is:merged merged:YYYY-MM-DD..YYYY-MM-DD
-        q = f"repo:{org}/{repo} is:pr is:merged merged:{since_iso[:10]}..{until_iso[:10]}"
-        results: List[Dict[str, Any]] = []
+        Pages stop early once a whole page was last updated before `stop_before`
+        (nothing older can have been merged inside the window).
+        """
+        out: List[Tuple[Dict[str, Any], int, int]] = []
+        if not states: return out  # e.g. open + merged-only; an empty filter would mean "all states"
+        cursor: Optional[str] = None
+        while True:
+            conn = self.graphql(PR_QUERY, {"owner": org, "name": repo, "states": states,
+                                           "first": GRAPHQL_PAGE, "cursor": cursor})["repository"]["pullRequests"]
+            nodes = conn["nodes"] or []
+            for n in nodes:
+                out.append((pr_from_graphql(n), n["commits"]["totalCount"], n["reviews"]["totalCount"]))
+            if on_page: on_page(len(out), conn["totalCount"])
+            if not conn["pageInfo"]["hasNextPage"]: break
+            if stop_before is not None and nodes and iso_ts(nodes[-1]["updatedAt"]) < stop_before: break
+            cursor = conn["pageInfo"]["endCursor"]
+        return out
+
+    def list_recent_prs(self, org: str, repo: str, since_ts: Optional[float],
+                        state: str = "closed") -> List[Dict[str, Any]]:
+        # Pages are sorted by updated_at desc, and merged_at <= updated_at, so once a page ends
+        # before `since_ts` nothing further can have merged inside the window.
+        params: Dict[str, Any] = {"state": state, "sort": "updated", "direction": "desc", "per_page": 100}
+        out: List[Dict[str, Any]] = []
         page = 1
         while True:
-            resp = self._get("/search/issues", {"q": q, "per_page": 100, "page": page}).json()
-            items = resp.get("items") or []
-            if not items: break
-            results.extend(items)
-            if len(items) < 100: break
+            params["page"] = page
+            data = json_loads(self._get(f"/repos/{org}/{repo}/pulls", params=params).content)
+            if not data: break
+            out.extend(data)
+            if len(data) < params["per_page"]: break
+            updated_at = data[-1].get("updated_at")
+            if since_ts is not None and updated_at and iso_ts(updated_at) < since_ts: break
             page += 1
-        # Normalize to PR-like dicts (we still fetch commits/reviews below)
-        for it in results:
-            it["number"] = it.get("number")
-            it["title"] = it.get("title")
-            it["state"] = "closed"  # merged implies closed
-            it["created_at"] = it.get("created_at")
-            it["merged_at"] = it.get("closed_at")  # search returns closed_at for merged PRs
-            it["user"] = {"login": (it.get("user") or {}).get("login", "")}
-            it["merge_commit_sha"] = ""  # will be blank unless we fetch PR details; not strictly needed
-            it["html_url"] = it.get("html_url")
-            it["body"] = it.get("body") or ""
-        return results
+        return out
+
+def pr_from_graphql(node: Dict[str, Any]) -> Dict[str, Any]:
+    # Map a GraphQL PullRequest node onto the REST field names pr_row() reads.
+    return {
+        "number": node["number"], "title": node["title"],
+        "state": "open" if node["state"] == "OPEN" else "closed",  # MERGED is closed in REST terms
+        "created_at": node["createdAt"], "updated_at": node["updatedAt"], "merged_at": node["mergedAt"],
+        "user": {"login": (node.get("author") or {}).get("login", "")},
+        "merge_commit_sha": (node.get("mergeCommit") or {}).get("oid", ""),
+        "html_url": node["url"], "body": node.get("body") or "",
+    }
+
+def graphql_states(state: str, merged_only: bool) -> List[str]:
+    states = {"open": ["OPEN"], "closed": ["CLOSED", "MERGED"], "all": ["OPEN", "CLOSED", "MERGED"]}[state]
+    return [s for s in states if s == "MERGED"] if merged_only else states
 
 def normalize_iso(s: Optional[str]) -> Optional[str]:
     if not s: return None
@@ -95,12 +384,18 @@ def normalize_iso(s: Optional[str]) -> Optional[str]:
     except Exception:
         raise SystemExit(f"Invalid date format: {s}. Use YYYY-MM-DD or full ISO.")
 
-def within_merged_window(pr: Dict[str, Any], since_iso: Optional[str], until_iso: Optional[str]) -> bool:
+def iso_ts(s: str) -> float:
+    # GitHub timestamps end in "Z", which fromisoformat() only accepts from 3.11; naive inputs are UTC.
+    d = dt.datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    return (d if d.tzinfo else d.replace(tzinfo=dt.timezone.utc)).timestamp()
+
+def within_merged_window(pr: Dict[str, Any], since_ts: Optional[float], until_ts: Optional[float]) -> bool:
     merged_at = pr.get("merged_at")
     if merged_at is None: return False
-    if since_iso is None and until_iso is None: return True
-    if since_iso and merged_at < since_iso: return False
-    if until_iso and merged_at > until_iso: return False
+    if since_ts is None and until_ts is None: return True
+    merged_ts = iso_ts(merged_at)
+    if since_ts is not None and merged_ts < since_ts: return False
+    if until_ts is not None and merged_ts > until_ts: return False
     return True
 
 def pr_row(pr: Dict[str, Any], commits_count: int, reviews_count: int) -> Dict[str, Any]:
@@ -118,18 +413,20 @@ def pr_row(pr: Dict[str, Any], commits_count: int, reviews_count: int) -> Dict[s
         "url": pr.get("html_url",""),
     }
 
+# pr_row() always fills every column, so a plain itemgetter replaces DictWriter's per-key lookups.
+CSV_FIELDS = ("number","title","state","created_at","merged_at","author","merge_commit_sha",
+              "commits_count","reviews_count","description","url")
+row_tuple = operator.itemgetter(*CSV_FIELDS)
+
 def write_repo_csv(rows: List[Dict[str, Any]], output_dir: Path, repo: str) -> Path:
     output_dir.mkdir(parents=True, exist_ok=True)
     path = output_dir / f"{repo}-pull-requests.csv"
-    fields = ["number","title","state","created_at","merged_at","author","merge_commit_sha",
-              "commits_count","reviews_count","description","url"]
     with path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fields); w.writeheader()
-        for r in rows: w.writerow(r)
-    log(f"OUTPUT_CSV {path}")
+        w = csv.writer(f); w.writerow(CSV_FIELDS)
+        w.writerows(map(row_tuple, rows))
     return path
 
-def main() -> int:
+def build_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser(description="Extract GitHub Pull Requests for specified repositories.")
     ap.add_argument("--token")
     ap.add_argument("--org", default="name-of-organisation")
@@ -138,82 +435,133 @@ def main() -> int:
     ap.add_argument("--since"); ap.add_argument("--until")
     ap.add_argument("--state", choices=["open","closed","all"], default="closed")
     ap.add_argument("--merged-only", action=argparse.BooleanOptionalAction, default=True)
+    ap.add_argument("--api", choices=["graphql","rest"], default="graphql",
+                    help="graphql: PRs + commit/review counts, 50 per request (default). "
+                         "rest: list PRs, then 2 paginated calls per PR.")
     ap.add_argument("--verbose", action="store_true")
     ap.add_argument("--emit-progress", action="store_true")
     ap.add_argument("--audit-log")
-    args = ap.parse_args()
+    ap.add_argument("--cache-dir", default=str(CACHE_DIR), help="ETag cache for conditional requests.")
+    ap.add_argument("--no-cache", action="store_true", help="Disable the ETag cache (always re-download).")
+    return ap
+
+MISSING_TOKEN = "Error: GitHub token is required (pass --token or set GITHUB_TOKEN)."
 
+def run(args: argparse.Namespace, on_progress: ProgressFn, on_output: OutputFn, on_log: LogFn = log,
+        cancel: Optional[threading.Event] = None) -> int:
+    """Run an extraction for parsed `args`, reporting progress, written CSVs and log lines via callbacks."""
     token = args.token or os.environ.get("GITHUB_TOKEN")
     if not token:
-        print("Error: GitHub token is required (pass --token or set GITHUB_TOKEN).", file=sys.stderr, flush=True)
+        on_log(MISSING_TOKEN)
         return 1
 
     since_iso = normalize_iso(args.since)
     until_iso = normalize_iso(args.until)
-    apply_window = (since_iso is not None) or (until_iso is not None)
+    since_ts = iso_ts(since_iso) if since_iso else None
+    until_ts = iso_ts(until_iso) if until_iso else None
+    apply_window = (since_ts is not None) or (until_ts is not None)
 
-    log("\n=== Filters ===")
-    log("  type:       is:pr")
-    log(f"  state:      {args.state}")
-    log(f"  is:merged:  {'true' if args.merged_only else 'false'}")
-    if apply_window: log(f"  merged_at:  {since_iso or '-inf'}  ->  {until_iso or '+inf'}")
-    else: log("  merged_at:  ALL TIME (no date window)")
-    log("==============\n")
+    on_log("\n=== Filters ===")
+    on_log("  type:       is:pr")
+    on_log(f"  state:      {args.state}")
+    on_log(f"  is:merged:  {'true' if args.merged_only else 'false'}")
+    on_log(f"  api:        {args.api}")
+    if apply_window: on_log(f"  merged_at:  {since_iso or '-inf'}  ->  {until_iso or '+inf'}")
+    else: on_log("  merged_at:  ALL TIME (no date window)")
+    on_log("==============\n")
 
-    gh = GitHubAPI(token=token, verbose=args.verbose)
+    gh = GitHubAPI(token=token, verbose=args.verbose,
+                   cache_dir=None if args.no_cache else Path(args.cache_dir), on_log=on_log, on_progress=on_progress,
+                   cancel=cancel)
     out_dir = Path(args.output_dir)
-    repos = args.repos
+    repos = list(dict.fromkeys(args.repos))  # a repeated name would race two threads onto one CSV
 
     t0 = time.time()
     total_rows = 0
 
-    for repo in repos:
-        log(f"[{repo}] fetching PRs...")
-        # Fast path: if you gave a date window AND merged_only, use Search API to pre-filter
-        pr_list: List[Dict[str, Any]]
-        if apply_window and args.merged_only:
-            pr_list = gh.search_merged_prs(args.org, repo, since_iso or "1970-01-01T00:00:00+00:00",
-                                           until_iso or dt.datetime.now(dt.timezone.utc).isoformat())
+    tracker = RepoProgress(repos, start=5, span=90, on_progress=on_progress)
+
+    def rest_rows(repo: str) -> List[Dict[str, Any]]:
+        # With a merge window, walk updated-desc pages only back to `since`; the window itself is client-side.
+        if apply_window:
+            raw = gh.list_recent_prs(args.org, repo, since_ts, state=args.state)
         else:
             raw = gh.list_repo_prs(args.org, repo, state=args.state)
-            pr_list = [p for p in raw if (not args.merged_only or p.get("merged_at"))]
-            if apply_window:
-                pr_list = [p for p in pr_list if within_merged_window(p, since_iso, until_iso)]
+        pr_list = [p for p in raw if (not args.merged_only or p.get("merged_at"))]
+        if apply_window:
+            pr_list = [p for p in pr_list if within_merged_window(p, since_ts, until_ts)]
 
-        if args.emit_progress:
-            progress(5, f"{repo}: {len(pr_list)} PRs to process")
+        tracker.update(repo, 0.0, f"{repo}: {len(pr_list)} PRs to process")
 
-        rows: List[Dict[str, Any]] = []
+        # Commit/review counts per PR are independent single GETs: fan them out and record as they land.
+        counts: Dict[Any, Dict[str, int]] = {pr.get("number"): {} for pr in pr_list}
         N = max(1, len(pr_list))
-        for i, pr in enumerate(pr_list, start=1):
-            num = pr.get("number")
-            commits = gh.list_pr_commits(args.org, repo, num)
-            reviews = gh.list_pr_reviews(args.org, repo, num)
-            rows.append(pr_row(pr, len(commits), len(reviews)))
+        done = 0
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            futs = {ex.submit(gh.count_pr_commits, args.org, repo, pr.get("number")): ("commits", pr)
+                    for pr in pr_list}
+            futs.update({ex.submit(gh.count_pr_reviews, args.org, repo, pr.get("number")): ("reviews", pr)
+                         for pr in pr_list})
+            for fut in as_completed(futs):
+                kind, pr = futs[fut]
+                c = counts[pr.get("number")]
+                c[kind] = fut.result()
+                if len(c) < 2: continue
+                done += 1
+                tracker.update(repo, done / N, f"{repo}: processing {done}/{N}")
+
+        rows: List[Dict[str, Any]] = []
+        for pr in pr_list:
+            c = counts[pr.get("number")]
+            rows.append(pr_row(pr, c["commits"], c["reviews"]))
+        return rows
+
+    def graphql_rows(repo: str) -> List[Dict[str, Any]]:
+        def on_page(fetched: int, total: int):
+            tracker.update(repo, fetched / max(1, total), f"{repo}: fetched {fetched}/{total} PRs")
+        prs = gh.list_prs_graphql(args.org, repo, graphql_states(args.state, args.merged_only),
+                                  stop_before=since_ts, on_page=on_page)
+        return [pr_row(pr, commits, reviews) for pr, commits, reviews in prs
+                if (not args.merged_only or pr.get("merged_at"))
+                and (not apply_window or within_merged_window(pr, since_ts, until_ts))]
 
-            if args.emit_progress:
-                pct = 5 + int(90 * (i / N))
-                progress(pct, f"{repo}: processing {i}/{N}")
+    def process_repo(repo: str) -> Tuple[str, int]:
+        on_log(f"[{repo}] fetching PRs...")
+        rows = graphql_rows(repo) if args.api == "graphql" else rest_rows(repo)
+        on_output(write_repo_csv(rows, out_dir, repo))
+        tracker.update(repo, 1.0, f"{repo}: wrote {len(rows)} rows")
+        return repo, len(rows)
 
-        write_repo_csv(rows, out_dir, repo)
-        total_rows += len(rows)
+    # Repos are independent; they share gh (one session, pool and rate-limit budget).
+    with ThreadPoolExecutor(max_workers=max(1, min(REPO_WORKERS, len(repos)))) as ex:
+        for fut in as_completed([ex.submit(process_repo, r) for r in repos]):
+            _, n = fut.result()
+            total_rows += n
 
-    if args.emit_progress: progress(100, "Completed")
+    on_progress(100, "Completed")
 
     if args.audit_log:
         try:
             with open(args.audit_log, "a", encoding="utf-8") as f:
-                f.write(json.dumps({
+                f.write(json_dumps({
                     "ts": time.time(), "tool": "pull-request-extractor",
                     "params": {"org": args.org, "repos": repos, "since": args.since, "until": args.until,
-                               "state": args.state, "merged_only": bool(args.merged_only)},
+                               "state": args.state, "merged_only": bool(args.merged_only), "api": args.api},
                     "rows_written": total_rows, "duration_sec": time.time() - t0,
                 }) + "\n")
         except Exception:
             pass
 
-    log("\nDone.")
+    on_log("\nDone.")
     return 0
 
+def main() -> int:
+    args = build_parser().parse_args()
+    if not (args.token or os.environ.get("GITHUB_TOKEN")):  # CLI usage error: stderr, as before run() existed
+        print(MISSING_TOKEN, file=sys.stderr, flush=True)
+        return 1
+    on_progress: ProgressFn = progress if args.emit_progress else (lambda pct, msg: None)
+    return run(args, on_progress, lambda path: log(f"OUTPUT_CSV {path}"))
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -4,17 +4,31 @@ import json
 import uuid
 import time
 import threading
-import subprocess
+import traceback
+import importlib.util
+from collections import deque
+from types import ModuleType
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Deque, Dict, Any, List, Optional, Union
 
 from flask import Flask, request, send_file, jsonify, send_from_directory
 
+try:
+    import orjson  # optional: 3-5x faster parse/emit than stdlib json on audit entries
+except ImportError:
+    orjson = None
+
 APP_ROOT = Path(__file__).resolve().parent
 WEB_DIR = APP_ROOT / "web"
 OUT_ROOT = APP_ROOT / "output"
 AUDIT_LOG = APP_ROOT / "audit-log.jsonl"
 
+def json_loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def json_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode() if orjson else json.dumps(obj, ensure_ascii=False)
+
 app = Flask(__name__, static_folder=None)
 OUT_ROOT.mkdir(exist_ok=True)
 
@@ -30,19 +44,54 @@ class Job:
         self.status = "queued"
         self.progress = 0
         self.message = "Queued"
-        self.log: List[str] = []
+        self.log: Deque[str] = deque(maxlen=LOG_LIMIT)  # O(1) append, oldest lines evicted
         self.output_files: List[str] = []
-        self.proc: subprocess.Popen | None = None
+        self.thread: threading.Thread | None = None
         self.out_dir = OUT_ROOT / job_id
         self.out_dir.mkdir(parents=True, exist_ok=True)
 
+    # Callbacks handed to the extractor's run(); called from its worker threads.
+    def _on_progress(self, pct: Optional[int], msg: str):
+        if pct is not None:
+            self.progress = max(0, min(100, int(pct)))
+        self.message = msg or self.message
+
+    def _on_output(self, path: Path):
+        fp = path.resolve()
+        if fp.exists() and fp.suffix.lower() == ".csv":
+            try:
+                self.output_files.append(str(fp.relative_to(self.out_dir)))
+            except ValueError:
+                self.output_files.append(str(fp))
+
+    def _on_log(self, msg: str):
+        for line in msg.splitlines():
+            line = line.rstrip()
+            if line:
+                self.log.append(line)
+
 JOBS: Dict[str, Job] = {}
+# Set when the server stops; running extractors abort instead of holding interpreter exit.
+SHUTDOWN = threading.Event()
 LOG_LIMIT = 400
 
+def load_tool(filename: str) -> ModuleType:
+    # The extractor scripts have hyphenated names, so import them by path.
+    spec = importlib.util.spec_from_file_location(Path(filename).stem.replace("-", "_"), APP_ROOT / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Extractors run in-process (no interpreter start-up per job): each exposes build_parser() and run().
+TOOLS: Dict[str, ModuleType] = {
+    "file-commit-history": load_tool("file-commit-history.py"),
+    "pull-request-extractor": load_tool("pull-request-extractor.py"),
+}
+
 def append_audit(entry: Dict[str, Any]):
     AUDIT_LOG.parent.mkdir(exist_ok=True, parents=True)
     with AUDIT_LOG.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.write(json_dumps(entry) + "\n")
 
 def mask_token(token: str) -> str:
     if not token:
@@ -57,18 +106,45 @@ def index():
 
 @app.get("/web/<path:filename>")
 def static_files(filename):
-    return send_from_directory(WEB_DIR, filename)
+    # ETag/Last-Modified let repeat loads revalidate to a 304; assets may be reused for an hour.
+    resp = send_from_directory(WEB_DIR, filename, conditional=True)
+    resp.headers["Cache-Control"] = "public, max-age=3600"
+    return resp
+
+def tail_lines(path: Path, n: int = 100, chunk: int = 65536) -> List[str]:
+    """Last n non-empty lines of a file, read backwards in chunks (cost independent of file size)."""
+    with path.open("rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        chunks: List[bytes] = []   # newest first
+        partial: List[bytes] = []  # pieces of the line straddling the read position, newest first
+        count = 0                  # non-empty complete lines seen so far
+        while pos > 0 and count < n:
+            step = min(chunk, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step)
+            chunks.append(data)
+            # Only the newly read bytes are scanned: the piece before their first newline may be partial.
+            first, sep, rest = data.partition(b"\n")
+            if not sep:
+                partial.append(data)
+                continue
+            *middle, last = rest.split(b"\n")
+            count += bool((last + b"".join(reversed(partial))).strip()) + sum(1 for l in middle if l.strip())
+            partial = [first]
+    buf = b"".join(reversed(chunks))
+    pieces = buf.split(b"\n")
+    if pos > 0:
+        pieces = pieces[1:]
+    lines = [l for l in pieces if l.strip()]
+    return [l.decode("utf-8").strip() for l in lines[-n:]]
 
 @app.get("/api/audit")
 def api_audit():
     lines = []
     if AUDIT_LOG.exists():
-        with AUDIT_LOG.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    lines.append(json.loads(line))
-    return jsonify(lines[-100:])
+        lines = [json_loads(line) for line in tail_lines(AUDIT_LOG, 100)]
+    return jsonify(lines)
 
 @app.post("/api/extract")
 def api_extract():
@@ -77,7 +153,7 @@ def api_extract():
     token = (data.get("token") or "").strip()
     args = data.get("args") or {}
 
-    if tool_type not in {"file-commit-history", "pull-request-extractor"}:
+    if tool_type not in TOOLS:
         return jsonify({"error": "Invalid 'type'"}), 400
     if not token:
         return jsonify({"error": "GitHub token is required"}), 400
@@ -86,21 +162,18 @@ def api_extract():
     job = Job(job_id, tool_type, args, mask_token(token))
     JOBS[job_id] = job
 
+    base_cmd = ["--output-dir", str(job.out_dir), "--audit-log", str(job.out_dir / "script-audit.jsonl")]
     if tool_type == "file-commit-history":
-        script = str(APP_ROOT / "file-commit-history.py")
-        base_cmd = ["python", "-u", script, "--output-dir", str(job.out_dir),
-                    "--emit-progress", "--audit-log", str(job.out_dir / "script-audit.jsonl")]
         arg_map = {
             "org": "--org", "repos": "--repos", "file_path": "--file-path",
             "since": "--since", "until": "--until", "sha": "--sha", "verbose": "--verbose",
+            "no_file_stats": "--no-file-stats",
         }
     else:
-        script = str(APP_ROOT / "pull-request-extractor.py")
-        base_cmd = ["python", "-u", script, "--output-dir", str(job.out_dir),
-                    "--emit-progress", "--audit-log", str(job.out_dir / "script-audit.jsonl")]
         arg_map = {
             "org": "--org", "repos": "--repos", "since": "--since", "until": "--until",
             "state": "--state", "merged_only": "--merged-only", "verbose": "--verbose",
+            "api": "--api",
         }
 
     cmd = list(base_cmd)
@@ -120,7 +193,7 @@ def api_extract():
         if val is None or val == "":
             continue
         if isinstance(val, bool):
-            if key in ("verbose", "merged_only"):
+            if key in ("verbose", "merged_only", "no_file_stats"):
                 if val:
                     cmd.append(flag)
                 else:
@@ -132,68 +205,39 @@ def api_extract():
     cmd.extend(["--token", token])
 
     # For visibility in audit (mask token)
-    cmd_preview = [c if c != token else "[TOKEN]" for c in cmd]
+    token_set = {token}
+    cmd_preview = [f"{tool_type}.py"] + ["[TOKEN]" if c in token_set else c for c in cmd]
     append_audit({
         "ts": time.time(), "job_id": job_id, "tool": job.tool,
         "args": job.args, "token_masked": job.token_masked,
         "status": "started", "cmd_preview": cmd_preview
     })
 
-    t = threading.Thread(target=run_job, args=(job_id, cmd), daemon=True)
-    t.start()
+    job.thread = threading.Thread(target=run_job, args=(job_id, cmd), daemon=True)
+    job.thread.start()
 
     return jsonify({"job_id": job_id})
 
-def run_job(job_id: str, cmd: List[str]):
+def run_job(job_id: str, argv: List[str]):
     job = JOBS[job_id]
     job.status = "running"
     job.started_ts = time.time()
     job.message = "Starting..."
     job.progress = 1
 
-    env = os.environ.copy()
-    env["PYTHONUNBUFFERED"] = "1"
-    env["PYTHONIOENCODING"] = "utf-8"
+    tool = TOOLS[job.tool]
+    parser = tool.build_parser()
+    def arg_error(message: str):  # keep argparse's usage error in the job log, not the server's stderr
+        raise SystemExit(f"{job.tool}: error: {message}")
+    parser.error = arg_error
 
     try:
-        job.proc = subprocess.Popen(
-            cmd,
-            cwd=str(APP_ROOT),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,            # line-buffered at the OS pipe layer
-            universal_newlines=True,
-            env=env,
-        )
-        assert job.proc.stdout is not None
-        for line in job.proc.stdout:
-            line = line.rstrip("\n")
-            if not line:
-                continue
-            job.log.append(line)
-            if len(job.log) > LOG_LIMIT:
-                job.log = job.log[-LOG_LIMIT:]
-
-            if line.startswith("PROGRESS "):
-                try:
-                    payload = json.loads(line[len("PROGRESS "):].strip())
-                    job.progress = max(0, min(100, int(payload.get("pct", job.progress))))
-                    job.message = payload.get("msg", job.message) or job.message
-                except Exception:
-                    pass
-
-            if line.startswith("OUTPUT_CSV "):
-                p = line[len("OUTPUT_CSV "):].strip().strip('"')
-                fp = (APP_ROOT / p).resolve() if not Path(p).is_absolute() else Path(p)
-                if fp.exists() and fp.suffix.lower() == ".csv":
-                    try:
-                        rel = fp.relative_to(job.out_dir)
-                        job.output_files.append(str(rel))
-                    except Exception:
-                        job.output_files.append(str(fp))
-
-        ret = job.proc.wait()
+        try:
+            ret = tool.run(parser.parse_args(argv), job._on_progress, job._on_output, job._on_log, cancel=SHUTDOWN)
+        except SystemExit as e:  # bad args and invalid dates exit like the CLI would
+            if e.code is not None and not isinstance(e.code, int):
+                job._on_log(str(e.code))
+            ret = 0 if e.code is None else e.code if isinstance(e.code, int) else 1
         job.ended_ts = time.time()
         if ret == 0:
             job.status = "succeeded"
@@ -203,6 +247,7 @@ def run_job(job_id: str, cmd: List[str]):
             job.status = "failed"
             job.message = f"Exited with code {ret}"
     except Exception as e:
+        job._on_log(traceback.format_exc())
         job.status = "failed"
         job.message = f"Exception: {e}"
         job.ended_ts = time.time()
@@ -228,7 +273,7 @@ def api_status(job_id: str):
     return jsonify({
         "job_id": job.job_id, "tool": job.tool, "status": job.status,
         "progress": job.progress, "message": job.message,
-        "log": job.log[-LOG_LIMIT:], "outputs": job.output_files,
+        "log": list(job.log), "outputs": job.output_files,
     })
 
 @app.get("/api/download/<job_id>/<path:filename>")
@@ -241,6 +286,21 @@ def api_download(job_id: str, filename: str):
         return jsonify({"error": "File not found"}), 404
     return send_file(path, as_attachment=True, download_name=path.name)
 
+def serve_forever(port: int):
+    if os.environ.get("DEBUG") == "1":
+        app.run(host="127.0.0.1", port=port, debug=True, threaded=True)
+        return
+    try:
+        from waitress import serve  # production WSGI server: keep-alive, no reloader
+    except ImportError:
+        print("waitress not installed; falling back to the Flask dev server (pip install waitress)", flush=True)
+        app.run(host="127.0.0.1", port=port, threaded=True)
+    else:
+        serve(app, host="127.0.0.1", port=port, threads=8)
+
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", "8000"))
-    app.run(host="127.0.0.1", port=port, debug=True, threaded=True)
+    try:
+        serve_forever(int(os.environ.get("PORT", "8000")))
+    finally:
+        # Extractor pools are joined at interpreter exit; cancel running jobs (incl. rate-limit sleeps) first.
+        SHUTDOWN.set()
@@ -78,6 +78,12 @@ const FORMS = {
           </div>
         </div>
       </div>
+      <div class="form-group">
+        <label for="no_file_stats">
+          <input type="checkbox" id="no_file_stats" style="margin-right: 8px;"/>
+          Skip per-commit file stats <span class="help-text">(one fewer API call per commit; status/additions/deletions left blank)</span>
+        </label>
+      </div>
       <div class="form-group">
         <label for="verbose">
           <input type="checkbox" id="verbose" style="margin-right: 8px;"/>